@@ -1,19 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
-from datetime import datetime
-from typing import Dict, Any
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import logging
 import os
 
-from app.services.llm_groq import groq_generate
-from app.services.daily_analysis import analyze_by_local_day
-from app.services.preprocess import compute_features
-from app.services.well_l04 import evaluate_l04
-from app.services.data_service import fetch_rows
+import numpy as np
+from cachetools import TTLCache
+from postgrest.exceptions import APIError
+
+from app.services.llm_groq import close_client, groq_generate, warm_client
+from app.services.daily_analysis import analyze_by_local_day, analyze_daily_series
+from app.services.preprocess import compute_features_arr
+from app.services.timeseries import parse_iso8601, preprocess_rows
+from app.services.well_l04 import evaluate_l04_arr, warm_up
+from app.services.data_service import fetch_daily_series, fetch_rows, fetch_rows_arrays, fetch_rows_live
+from app.services.supabase_client import get_supabase
 
 load_dotenv()
 
-app = FastAPI(title="LightWell API")
+logger = logging.getLogger(__name__)
+
+def _warm_supabase() -> None:
+    try:
+        get_supabase()
+    except RuntimeError as exc:
+        logger.warning("Supabase client not initialized at startup: %s", exc)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pay one-time costs (L04 kernel JIT, Groq TLS, Supabase client) before the first request
+    await asyncio.gather(
+        asyncio.to_thread(warm_up),
+        asyncio.to_thread(_warm_supabase),
+        warm_client(),
+    )
+    yield
+    await close_client()
+
+app = FastAPI(title="LightWell API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +54,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# /data echoes raw rows (repeated keys + ISO timestamps): compresses 5-10x
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 @app.get("/health")
 def health():
     return {
@@ -33,59 +67,188 @@ def health():
         "GROQ_MODEL_set": bool(os.getenv("GROQ_MODEL")),
     }
 
+@lru_cache(maxsize=2048)
+def _parse_iso8601_dt(s: str) -> datetime:
+    """
+    Parse an ISO 8601 string (accepts 'Z') into a datetime.
+    Memoized: dashboards poll the same start/end pairs repeatedly.
+    Raises ValueError on invalid input (exceptions are not cached).
+    """
+    return parse_iso8601(s)
+
+
+@lru_cache(maxsize=2048)
+def _canonical_iso8601(s: str) -> str:
+    """
+    Normalize to UTC isoformat, so equivalent spellings of the same instant
+    ('Z', '+00:00', '-05:00', ...) share one _CONTEXT_CACHE entry.
+    """
+    dt = _parse_iso8601_dt(s)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.isoformat()
+
+
 def _parse_iso8601(s: str) -> str:
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
     try:
-        datetime.fromisoformat(s)
-        return s
+        return _canonical_iso8601(s)
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid ISO 8601 datetime: {s}",
         )
 
+def _analyze(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    CPU-bound part of every endpoint (features + L04, global and per local day).
+    Rows are converted once into time-sorted column arrays shared by every consumer.
+    """
+    return _analyze_arrays(*preprocess_rows(rows))
+
+def _analyze_arrays(ts_ns: np.ndarray, edi: np.ndarray) -> Dict[str, Any]:
+    """
+    Same as _analyze, on time-sorted column arrays (fetch_rows_arrays).
+    """
+    return _with_global_figures(ts_ns, edi, analyze_by_local_day(ts_ns, edi))
+
+def _analyze_series(series_by_day: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, Any]:
+    """
+    Same as _analyze, for samples already grouped by local day (fetch_daily_series).
+    """
+    daily = analyze_daily_series(series_by_day)
+
+    if series_by_day:
+        # Days come in ascending order, each time-sorted: the concatenation is sorted too
+        ts_ns = np.concatenate([ts for ts, _ in series_by_day.values()])
+        edi = np.concatenate([e for _, e in series_by_day.values()])
+    else:
+        ts_ns = np.empty(0, dtype=np.int64)
+        edi = np.empty(0, dtype=np.float64)
+
+    return _with_global_figures(ts_ns, edi, daily)
+
+def _with_global_figures(ts_ns: np.ndarray, edi: np.ndarray, daily: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Analysis result: global figures over the whole time-sorted window + the per-day ones.
+    """
+    return {
+        "features_global": compute_features_arr(ts_ns, edi, presorted="asc"),
+        "l04_global": evaluate_l04_arr(ts_ns, edi),
+        "features_by_day": daily["features_by_day"],
+        "l04_by_day": daily["l04_by_day"],
+    }
+
+# PostgREST error code for an unknown RPC (sql/l04_daily.sql not applied)
+_PGRST_FUNCTION_NOT_FOUND = "PGRST202"
+_rpc_missing_warned = False
+
+def _warn_rpc_missing() -> None:
+    global _rpc_missing_warned
+    if not _rpc_missing_warned:
+        _rpc_missing_warned = True
+        logger.warning("l04_daily database function not found (apply sql/l04_daily.sql); using raw rows")
+
+# (start, end) -> (count, context, rows | None); dashboards poll the same window repeatedly
+_CONTEXT_TTL_S = 60
+_CONTEXT_CACHE: TTLCache = TTLCache(maxsize=128, ttl=_CONTEXT_TTL_S)
+
+
+def _is_live_window(end: str) -> bool:
+    """
+    True if end is within the cache TTL of now: samples may still be arriving,
+    so a cached context could miss them.
+    """
+    dt = _parse_iso8601_dt(end)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # naive timestamps are UTC (see timeseries)
+    return dt >= datetime.now(timezone.utc) - timedelta(seconds=_CONTEXT_TTL_S)
+
+async def _build_context(
+    start: str,
+    end: str,
+    with_rows: bool = False,
+) -> Tuple[int, Dict[str, Any], Optional[List[Dict[str, Any]]]]:
+    """
+    Fetch samples for [start, end] and compute the shared analysis context.
+    Results are memoized for 60 s so /data, /insight and /ask share one fetch + compute;
+    windows ending in the last 60 s (live dashboards) are always recomputed, on top of
+    an incremental fetch (fetch_rows_live).
+
+    By default samples come pre-grouped by local day from the l04_daily database
+    function; with_rows=True fetches the raw rows instead (only /data returns them).
+    """
+    key = (start, end)
+    live = _is_live_window(end)
+    cached = None if live else _CONTEXT_CACHE.get(key)
+    if cached is not None and (cached[2] is not None or not with_rows):
+        return cached
+
+    rows: Optional[List[Dict[str, Any]]] = None
+
+    if live:
+        # Polled "up to now" windows: only rows since the previous poll are fetched
+        count, rows = await asyncio.to_thread(fetch_rows_live, start=start, end=end)
+        analysis = await asyncio.to_thread(_analyze, rows)
+    elif with_rows:
+        count, rows = await asyncio.to_thread(fetch_rows, start=start, end=end)
+        analysis = await asyncio.to_thread(_analyze, rows)
+    else:
+        try:
+            series_by_day = await asyncio.to_thread(fetch_daily_series, start=start, end=end)
+        except APIError as exc:
+            # Only a missing l04_daily function falls back; outages/auth errors propagate
+            if exc.code != _PGRST_FUNCTION_NOT_FOUND:
+                raise
+            _warn_rpc_missing()
+            ts_ns, edi = await asyncio.to_thread(fetch_rows_arrays, start=start, end=end)
+            count = int(edi.size)
+            analysis = await asyncio.to_thread(_analyze_arrays, ts_ns, edi)
+        else:
+            count = sum(edi.size for _, edi in series_by_day.values())
+            analysis = await asyncio.to_thread(_analyze_series, series_by_day)
+
+    context = {
+        "range": {"start": start, "end": end},
+        **analysis,
+    }
+
+    if not live:
+        _CONTEXT_CACHE[key] = (count, context, rows)
+    return count, context, rows
+
 @app.get("/data")
-def get_data(start: str, end: str) -> Dict[str, Any]:
+async def get_data(start: str, end: str, include_rows: bool = True) -> Dict[str, Any]:
     start = _parse_iso8601(start)
     end = _parse_iso8601(end)
 
+    # Without rows, /data shares the day-grouped fetch (and cache entry) with /insight
     try:
-        count, rows = fetch_rows(start=start, end=end)
+        count, context, rows = await _build_context(start, end, with_rows=include_rows)
     except Exception as exc:
         raise HTTPException(
             status_code=500,
             detail="Data service failed",
         ) from exc
 
-    daily = analyze_by_local_day(rows)
-
-    return {
+    response = {
         "count": count,
-        "features_global": compute_features(rows),
-        "l04_global": evaluate_l04(rows),
-        "features_by_day": daily["features_by_day"],
-        "l04_by_day": daily["l04_by_day"],
-        "rows": rows,
+        "features_global": context["features_global"],
+        "l04_global": context["l04_global"],
+        "features_by_day": context["features_by_day"],
+        "l04_by_day": context["l04_by_day"],
     }
+    if include_rows:
+        response["rows"] = rows
+    return response
 
 @app.get("/insight")
-def insight(start: str, end: str) -> Dict[str, Any]:
+async def insight(start: str, end: str) -> Dict[str, Any]:
     start = _parse_iso8601(start)
     end = _parse_iso8601(end)
 
-    count, rows = fetch_rows(start=start, end=end)
-    daily = analyze_by_local_day(rows)
+    count, context, _ = await _build_context(start, end)
 
-    context = {
-        "range": {"start": start, "end": end},
-        "features_global": compute_features(rows),
-        "l04_global": evaluate_l04(rows),
-        "features_by_day": daily["features_by_day"],
-        "l04_by_day": daily["l04_by_day"],
-    }
-
-    llm = groq_generate(context=context, question=None)
+    llm = await groq_generate(context=context, question=None)
 
     return {
         "count": count,
@@ -94,22 +257,13 @@ def insight(start: str, end: str) -> Dict[str, Any]:
     }
 
 @app.get("/ask")
-def ask(start: str, end: str, question: str) -> Dict[str, Any]:
+async def ask(start: str, end: str, question: str) -> Dict[str, Any]:
     start = _parse_iso8601(start)
     end = _parse_iso8601(end)
 
-    count, rows = fetch_rows(start=start, end=end)
-    daily = analyze_by_local_day(rows)
-
-    context = {
-        "range": {"start": start, "end": end},
-        "features_global": compute_features(rows),
-        "l04_global": evaluate_l04(rows),
-        "features_by_day": daily["features_by_day"],
-        "l04_by_day": daily["l04_by_day"],
-    }
+    count, context, _ = await _build_context(start, end)
 
-    llm = groq_generate(context=context, question=question)
+    llm = await groq_generate(context=context, question=question)
 
     return {
         "count": count,
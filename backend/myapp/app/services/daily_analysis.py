@@ -1,22 +1,31 @@
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import Dict, Any, Tuple
 from zoneinfo import ZoneInfo
 
-from app.services.well_l04 import evaluate_l04_daily
-from app.services.preprocess import compute_features_daily
+import numpy as np
+
+from app.services.well_l04 import evaluate_l04_day
+from app.services.preprocess import compute_features_arr
+from app.services.timeseries import (
+    get_tz,
+    local_offsets_ns,
+    map_days,
+    sort_by_time,
+    split_by_local_day,
+)
 
 
 LOCAL_TZ = "America/Bogota"
 
 
-def analyze_by_local_day(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+def analyze_by_local_day(ts_ns: np.ndarray, edi: np.ndarray) -> Dict[str, Any]:
     """
     Orchestrate daily analysis (local day in Bogotá):
       - L04 daily compliance (+ missing minutes / best streak)
       - Daily compact features
 
     Args:
-        rows: list of dicts with 'created_at' (UTC ISO 8601) and 'edi'
+        ts_ns: UTC epoch nanoseconds (int64), see timeseries.preprocess_rows
+        edi: EDI values aligned with ts_ns
 
     Returns:
         {
@@ -24,23 +33,62 @@ def analyze_by_local_day(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
           "features_by_day": { "YYYY-MM-DD": {...}, ... }
         }
     """
-    if not rows:
+    if ts_ns.size == 0:
         return {
             "l04_by_day": {},
             "features_by_day": {},
         }
 
-    # IMPORTANT:
-    # - Do NOT pre-convert timestamps here and then call per-day grouping again.
-    # - well_l04.evaluate_l04_daily and preprocess.compute_features_daily already group by local day.
-    return {
-        "l04_by_day": evaluate_l04_daily(rows, tz=LOCAL_TZ),
-        "features_by_day": compute_features_daily(rows, tz=LOCAL_TZ),
-    }
+    ts_ns, edi = sort_by_time(ts_ns, edi)  # O(n) check for preprocess_rows output
+    tzinfo = get_tz(LOCAL_TZ)
+
+    # Resolve local times ONCE and bucket by local day (integer arithmetic on ns);
+    # each day gets its slice of local_ns instead of recomputing offsets.
+    local_ns = ts_ns + local_offsets_ns(ts_ns, LOCAL_TZ)
+
+    return _collect(map_days(
+        lambda idx: _analyze_day(ts_ns[idx], local_ns[idx], edi[idx], tzinfo),
+        split_by_local_day(local_ns),
+    ))
+
+
+def analyze_daily_series(series_by_day: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, Any]:
+    """
+    Same as analyze_by_local_day, for samples already grouped by local day
+    (e.g. by the l04_daily database function).
+
+    Args:
+        series_by_day: { "YYYY-MM-DD": (ts_ns UTC int64, edi float64), ... },
+                       time-sorted within each day
+    """
+    tzinfo = get_tz(LOCAL_TZ)
+
+    # No shared bucketing pass here: local times are derived per day
+    return _collect(map_days(
+        lambda series: _analyze_day(
+            series[0], series[0] + local_offsets_ns(series[0], LOCAL_TZ), series[1], tzinfo
+        ),
+        series_by_day,
+    ))
 
 
-def _parse_utc(s: str) -> datetime:
-    # Kept only if other parts of the codebase still import it.
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
-    return datetime.fromisoformat(s)
+def _analyze_day(
+    ts_ns: np.ndarray,
+    local_ns: np.ndarray,
+    edi: np.ndarray,
+    tzinfo: ZoneInfo,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    L04 result and compact features for the time-sorted samples of one local day.
+    """
+    return (
+        evaluate_l04_day(ts_ns, local_ns, edi, tzinfo),
+        compute_features_arr(ts_ns, edi, presorted="asc"),
+    )
+
+
+def _collect(results: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]) -> Dict[str, Any]:
+    return {
+        "l04_by_day": {day: l04 for day, (l04, _) in results.items()},
+        "features_by_day": {day: features for day, (_, features) in results.items()},
+    }
@@ -1,11 +1,33 @@
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from datetime import timezone
+import time
+
+import numpy as np
 
 from app.services.supabase_client import get_supabase
+from app.services.timeseries import (
+    NS_PER_SECOND,
+    parse_timestamps_ns,
+    rows_to_arrays,
+    sort_by_time,
+    to_datetime,
+)
+
+
+TABLE_NAME = "mediciones"
+TIME_COLUMN = "created_at"
+EDI_COLUMN = "edi"
+
+# PostgREST caps responses at max-rows (1000 by default on Supabase), so larger ranges are paged.
+PAGE_SIZE = 1000
 
 
 def fetch_rows(start: str, end: str) -> Tuple[int, List[Dict[str, Any]]]:
     """
-    Fetch EDI rows from Supabase filtered by time range.
+    Fetch raw EDI rows from Supabase filtered by time range.
+
+    Non-default path: only used where the raw rows themselves are needed (/data).
+    Analysis should use fetch_daily_series().
 
     Args:
         start: ISO 8601 datetime string (inclusive).
@@ -14,25 +36,154 @@ def fetch_rows(start: str, end: str) -> Tuple[int, List[Dict[str, Any]]]:
     Returns:
         Tuple with:
         - count: total number of rows
-        - rows: list of dicts with created_at and edi
+        - rows: list of dicts with id, created_at and edi (newest first)
     """
-    TABLE_NAME = "mediciones"
-    TIME_COLUMN = "created_at"
-    EDI_COLUMN = "edi"
+    rows = _fetch_range(start, end)
+    return len(rows), rows
+
+
+def fetch_rows_arrays(start: str, end: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same rows as fetch_rows, as column arrays: each page is converted to NumPy
+    as it arrives and its dicts are dropped, so only one page of dicts is alive.
+
+    Returns:
+        (ts_ns: UTC epoch nanoseconds int64, edi: float64), oldest first
+    """
+    chunks = [rows_to_arrays(page) for page in _iter_pages(start, end)]
+    if not chunks:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    ts_ns = np.concatenate([ts for ts, _ in chunks])
+    edi = np.concatenate([e for _, e in chunks])
+    return sort_by_time(ts_ns, edi)
+
+
+# Re-read this much before the newest cached row on every poll: created_at is set when a
+# transaction starts, so a row can commit after a poll with an earlier timestamp.
+LIVE_OVERLAP_NS = 60 * NS_PER_SECOND
+
+# Last window served by fetch_rows_live: (start_ns, fetched_at_ns, rows, ts_ns), newest first
+_live_window: Optional[Tuple[int, int, List[Dict[str, Any]], np.ndarray]] = None
+
+
+def fetch_rows_live(start: str, end: str) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Same as fetch_rows, for windows ending near (or after) now that dashboards poll
+    repeatedly (e.g. "today" or "last hour" every minute).
+
+    Cached rows are trusted only below a bound: the newest cached row, capped at the
+    previous fetch time, minus LIVE_OVERLAP_NS. Each poll re-fetches [bound, end]
+    and keeps the cached rows in [start, bound), so it costs the new rows plus
+    about a minute of overlap. The requested end is never used as the bound:
+    it may lie in the future ("today" ends at 23:59:59 local).
+    """
+    global _live_window
+
+    start_ns, end_ns = parse_timestamps_ns([start, end]).tolist()
+    fetched_at_ns = time.time_ns()
+
+    prev = _live_window  # replaced whole, never mutated: safe to read across threads
+
+    bound_ns = None
+    if prev is not None and prev[2] and prev[0] <= start_ns:
+        _, prev_fetched_at_ns, prev_rows, prev_ts = prev
+        bound_ns = min(int(prev_ts[0]), prev_fetched_at_ns) - LIVE_OVERLAP_NS
+        if not start_ns <= bound_ns <= end_ns:
+            bound_ns = None
+
+    if bound_ns is not None:
+        new_rows = _fetch_range(to_datetime(bound_ns, timezone.utc).isoformat(), end)
+        # newest first: rows >= bound are a prefix, rows >= start a longer prefix
+        lo = int(np.count_nonzero(prev_ts >= bound_ns))
+        hi = int(np.count_nonzero(prev_ts >= start_ns))
+        rows = new_rows + prev_rows[lo:hi]
+        ts_ns = np.concatenate((parse_timestamps_ns([r[TIME_COLUMN] for r in new_rows]), prev_ts[lo:hi]))
+    else:
+        rows = _fetch_range(start, end)
+        ts_ns = parse_timestamps_ns([r[TIME_COLUMN] for r in rows])
+
+    _live_window = (start_ns, fetched_at_ns, rows, ts_ns)
 
+    return len(rows), rows
+
+
+def fetch_daily_series(start: str, end: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Fetch EDI samples already grouped by local day, via the l04_daily
+    database function (see sql/l04_daily.sql).
+
+    Args:
+        start: ISO 8601 datetime string (inclusive).
+        end: ISO 8601 datetime string (inclusive).
+
+    Returns:
+        { "YYYY-MM-DD": (ts_ns UTC int64, edi float64), ... }, time-sorted within each day
+    """
+    sb = get_supabase()
+
+    res = sb.rpc("l04_daily", {"_start": start, "_end": end}).execute()
+
+    return {
+        r["day"]: (
+            parse_timestamps_ns(r["ts_arr"]),
+            np.asarray(r["edi_arr"], dtype=np.float64),
+        )
+        for r in (res.data or [])
+    }
+
+
+def _fetch_range(start: str, end: str) -> List[Dict[str, Any]]:
+    """
+    Rows with start <= created_at <= end, newest first.
+    """
+    rows: List[Dict[str, Any]] = []
+    for page in _iter_pages(start, end):
+        rows.extend(page)
+    return rows
+
+
+def _iter_pages(start: str, end: str) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Page through the range (see _fetch_range), newest first, PAGE_SIZE rows at a time.
+
+    Keyset pagination on (created_at, id): each page continues strictly below the
+    last row seen. With offsets, every row inserted into the range while paging
+    (live windows) shifted later pages by one and returned boundary rows twice.
+    """
     sb = get_supabase()
 
-    query = (
-        sb.table(TABLE_NAME)
-        .select(f"{TIME_COLUMN},{EDI_COLUMN}", count="exact")
-        .gte(TIME_COLUMN, start)
-        .lte(TIME_COLUMN, end)
-        .order(TIME_COLUMN, desc=True)
-    )
+    cursor: Optional[Tuple[str, Any]] = None
+
+    while True:
+        query = (
+            sb.table(TABLE_NAME)
+            .select(f"id,{TIME_COLUMN},{EDI_COLUMN}")
+            .gte(TIME_COLUMN, start)
+            .lte(TIME_COLUMN, end)
+        )
+
+        if cursor is not None:
+            # Timestamps contain reserved characters (: .), hence the quotes
+            last_ts, last_id = cursor
+            query = query.or_(
+                f'{TIME_COLUMN}.lt."{last_ts}",and({TIME_COLUMN}.eq."{last_ts}",id.lt.{last_id})'
+            )
 
-    res = query.execute()
+        # No count="exact": it makes PostgREST run a second COUNT(*) over the range.
+        res = (
+            query
+            .not_.is_(EDI_COLUMN, "null")
+            .order(TIME_COLUMN, desc=True)
+            .order("id", desc=True)  # unique tiebreak: the cursor is a total order
+            .limit(PAGE_SIZE)
+            .execute()
+        )
 
-    count = res.count if res.count is not None else len(res.data or [])
-    rows: List[Dict[str, Any]] = res.data or []
+        page = res.data or []
+        if page:
+            yield page
 
-    return count, rows
+        if len(page) < PAGE_SIZE:
+            break
+        cursor = (page[-1][TIME_COLUMN], page[-1]["id"])
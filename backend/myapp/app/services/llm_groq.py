@@ -1,15 +1,73 @@
+import asyncio
+import hashlib
+import heapq
 import json
+import numbers
 import os
-import time
+import random
+import re
 from typing import Any, Dict, List, Optional
 
 import httpx
+import orjson
+from cachetools import TTLCache
 
 
 class GroqError(RuntimeError):
     """Raised when Groq API call fails."""
 
 
+# NumPy arrays/scalars from the analysis are serialized natively (no .tolist() pass)
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# blake2b(messages) -> parsed LLM output; identical prompts (dashboard polling) skip the call
+_RESPONSE_CACHE: TTLCache = TTLCache(maxsize=256, ttl=300)
+
+# Opening fence line (``` or ```json) / closing fence line
+_FENCE_RE = re.compile(r"\A```[^\n]*\n?|\n?```[^\n]*\Z")
+
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """
+    Returns a shared HTTP/2 client so the TCP+TLS session to Groq is reused across requests.
+    """
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=15.0,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+
+    return _client
+
+
+async def warm_client() -> None:
+    """
+    Open the connection to Groq (DNS + TLS) before the first user request. Best-effort.
+    """
+    base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").strip()
+
+    try:
+        await _get_client().get(base_url, timeout=5.0)
+    except httpx.HTTPError:
+        pass
+
+
+async def close_client() -> None:
+    """Close the shared Groq client (called on app shutdown)."""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 def _get_env(name: str) -> str:
     v = os.getenv(name, "").strip()
     if not v:
@@ -17,6 +75,61 @@ def _get_env(name: str) -> str:
     return v
 
 
+def _get_semaphore() -> asyncio.Semaphore:
+    """
+    Returns the process-wide limiter for in-flight Groq calls (GROQ_CONCURRENCY, default 5).
+    Created lazily so .env is already loaded.
+    """
+    global _semaphore
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(int(os.getenv("GROQ_CONCURRENCY", "5")))
+
+    return _semaphore
+
+
+# Longest 429 wait allowed while holding a concurrency slot (the default backoff totals ~7 s)
+_MAX_RETRY_DELAY_S = 10.0
+
+
+def _retry_delay(resp: httpx.Response, backoff_s: float) -> Optional[float]:
+    """
+    Delay before retrying a 429: Retry-After (seconds) if present, else backoff_s, with +/-20% jitter.
+    None if the server asks for more than _MAX_RETRY_DELAY_S: fail fast instead of
+    blocking a GROQ_CONCURRENCY slot for minutes.
+    """
+    try:
+        delay = float(resp.headers.get("retry-after", backoff_s))
+    except ValueError:
+        # HTTP-date form; not worth parsing for a short backoff
+        delay = backoff_s
+
+    if delay > _MAX_RETRY_DELAY_S:
+        return None
+
+    return min(_MAX_RETRY_DELAY_S, delay * random.uniform(0.8, 1.2))
+
+
+# Sort key for days without a usable missing_minutes (sorts last, filtered out)
+_NO_MISSING_DATA = 999999
+
+
+def _missing(day_data: Any, tier_key: str) -> int:
+    try:
+        m = day_data[tier_key].get("missing_minutes", _NO_MISSING_DATA)
+    except (KeyError, TypeError, AttributeError):
+        return _NO_MISSING_DATA
+
+    # Fast path: well_l04 always produces ints
+    if type(m) is int:
+        return m
+
+    try:
+        return int(m)
+    except (TypeError, ValueError):
+        return _NO_MISSING_DATA
+
+
 def _compact_daily_l04(l04_by_day: Any, top_k: int = 7) -> Dict[str, Any]:
     """
     Reduce daily L04 payload to avoid token bloat.
@@ -33,25 +146,15 @@ def _compact_daily_l04(l04_by_day: Any, top_k: int = 7) -> Dict[str, Any]:
             "closest_tier_2": [],
         }
 
-    # Sort days (ISO date sorts lexicographically)
-    all_days = sorted(l04_by_day.keys())
-    most_recent_days = all_days[-top_k:]
-
-    def _missing(day_data: dict, tier_key: str) -> int:
-        try:
-            return int(day_data[tier_key].get("missing_minutes", 999999))
-        except Exception:
-            return 999999
-
-    # Compute closest days by missing minutes (smaller is better)
-    scored_t1 = [(d, _missing(l04_by_day[d], "tier_1")) for d in all_days]
-    scored_t2 = [(d, _missing(l04_by_day[d], "tier_2")) for d in all_days]
+    # ISO dates sort lexicographically; nlargest/nsmallest avoid full sorts (O(N log k))
+    most_recent_days = sorted(heapq.nlargest(top_k, l04_by_day.keys()))
 
-    scored_t1.sort(key=lambda x: x[1])
-    scored_t2.sort(key=lambda x: x[1])
+    # Closest days by missing minutes (smaller is better; ties -> earlier day)
+    scored_t1 = heapq.nsmallest(top_k, ((_missing(v, "tier_1"), d) for d, v in l04_by_day.items()))
+    scored_t2 = heapq.nsmallest(top_k, ((_missing(v, "tier_2"), d) for d, v in l04_by_day.items()))
 
-    closest_t1 = [d for d, m in scored_t1[:top_k] if m < 999999]
-    closest_t2 = [d for d, m in scored_t2[:top_k] if m < 999999]
+    closest_t1 = [d for m, d in scored_t1 if m < _NO_MISSING_DATA]
+    closest_t2 = [d for m, d in scored_t2 if m < _NO_MISSING_DATA]
 
     # Keep only union of (most recent) U (closest)
     keep_days = sorted(set(most_recent_days + closest_t1 + closest_t2))
@@ -86,6 +189,103 @@ def _compact_daily_l04(l04_by_day: Any, top_k: int = 7) -> Dict[str, Any]:
     }
 
 
+def _llm_context(context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Trim the analysis context to a bounded LLM payload.
+
+    Size is independent of the range length: range + scalar global features +
+    global L04 + at most 3 * top_k compact days. With top_k=7 the computed outputs
+    stay around 12 KB of JSON (~3-4k tokens) even for multi-month ranges.
+    """
+    features_global = context.get("features_global") or {}
+
+    return {
+        "range": context.get("range"),
+        "features_global": {
+            k: v for k, v in features_global.items()
+            if v is None or isinstance(v, (numbers.Number, str))
+        },
+        "l04_global": context.get("l04_global"),
+        "l04_by_day_compact": _compact_daily_l04(context.get("l04_by_day", {}), top_k=7),
+    }
+
+
+# ------------------------------------------------------------------
+# Static prompt parts (built once at import; only the computed outputs vary per call)
+# ------------------------------------------------------------------
+_SYSTEM_RULES = (
+    "You are a technical assistant specialized in circadian lighting and WELL v2 (L04/L05). "
+    "Use ONLY the provided data and definitions. "
+    "Do NOT invent measurements, timestamps, thresholds, standards, or compliance results. "
+    "If information is missing or insufficient, state it explicitly and explain what would be needed.\n\n"
+    "Output format rules:\n"
+    '- If no user question is provided: return JSON with keys: "summary", "recommendations".\n'
+    '- If a user question is provided: return JSON with keys: "answer", "notes".\n'
+    '- "summary" must be <= 120 words.\n'
+    '- "recommendations" must be an array of exactly 3 short items.\n'
+    "- Never include raw rows, time series dumps, or unnecessary numerical detail.\n"
+    "- When referencing WELL v2, focus on L04 and optionally mention L05 only as a stricter extension.\n"
+    "- If daily L04 results are available, explicitly report the day closest to compliance and missing minutes."
+)
+
+_CONTEXT_PREFIX = (
+    "PROJECT CONTEXT (AUTHORITATIVE — DO NOT IGNORE):\n\n"
+    "Project name: LightWell.\n"
+    "LightWell is a wearable-based circadian lighting assessment system.\n"
+    "It does NOT directly control luminaires.\n"
+    "Lighting control logic is implemented separately at the firmware level (e.g., ESP32).\n\n"
+    "This backend:\n"
+    "- estimates melanopic EDI from calibrated sensors,\n"
+    "- evaluates compliance with WELL v2 (L04),\n"
+    "- summarizes results and explains them to the user.\n\n"
+    "The LLM is used ONLY for interpretation and explanation.\n"
+    "All compliance decisions are computed deterministically in software, not by the LLM.\n\n"
+    "------------------------------------------------------------\n"
+    "WELL v2 – L04 (Circadian Lighting Design) — DEFINITION:\n\n"
+    "WELL L04 is a building and human health standard related to circadian lighting.\n"
+    "It is NOT related to oil, gas, drilling, or industrial well control.\n\n"
+    "Purpose:\n"
+    "Support circadian entrainment by ensuring sufficient morning exposure to melanopic light.\n\n"
+    "Metric:\n"
+    "- melanopic EDI (CIE S 026).\n\n"
+    "Core requirement:\n"
+    "- A continuous 4-hour window before local noon.\n"
+    "- The melanopic EDI threshold must be maintained continuously.\n"
+    "- Averages or accumulated dose are NOT sufficient.\n\n"
+    "Thresholds:\n"
+    "- Tier 1: >= 136 melanopic EDI.\n"
+    "- Tier 2: >= 250 melanopic EDI.\n\n"
+    "Interpretation:\n"
+    "- If no valid continuous 4-hour window exists, the day is non-compliant.\n"
+    "- If daily results exist, report missing minutes and the closest day to compliance.\n"
+    "- WELL L04 does NOT define night-time limits.\n"
+    "- Night-time reduction is a design choice, not a direct L04 requirement.\n\n"
+    "------------------------------------------------------------\n"
+    "DATA CONTEXT:\n\n"
+    "User timezone: America/Bogota (UTC-5).\n"
+    'Data source: Supabase table "mediciones" with fields:\n'
+    "- created_at (TIMESTAMPTZ, stored in UTC)\n"
+    "- edi (melanopic EDI estimate)\n\n"
+    "Computed outputs (authoritative, already validated):\n"
+)
+
+_USER_TASK_QA_SUFFIX = (
+    "Answer using ONLY the project and WELL L04 context above and the computed outputs. "
+    "If the question cannot be answered from the data, state clearly what is missing.\n"
+    'Return JSON with keys: "answer", "notes".\n'
+    "If daily L04 is available, include: closest day to Tier 1 compliance and missing minutes."
+)
+
+_USER_TASK_SUMMARY = (
+    "Generate:\n"
+    "1) A short summary (<= 120 words) describing the circadian lighting situation "
+    "and WELL L04 compliance status.\n"
+    "2) Exactly 3 actionable recommendations to improve or maintain WELL L04 compliance.\n"
+    'Return JSON with keys: "summary", "recommendations".\n'
+    "If daily L04 is available, mention the closest day to compliance and missing minutes."
+)
+
+
 def _build_messages(context: Dict[str, Any], question: Optional[str] = None) -> List[Dict[str, str]]:
     """
     Build a 3-message chat payload:
@@ -94,114 +294,44 @@ def _build_messages(context: Dict[str, Any], question: Optional[str] = None) ->
       3) user instruction (summary mode or Q&A mode)
     """
 
-    # ------------------------------------------------------------------
-    # 1) SYSTEM RULES (fixed behavior constraints)
-    # ------------------------------------------------------------------
-    system_rules = (
-        "You are a technical assistant specialized in circadian lighting and WELL v2 (L04/L05). "
-        "Use ONLY the provided data and definitions. "
-        "Do NOT invent measurements, timestamps, thresholds, standards, or compliance results. "
-        "If information is missing or insufficient, state it explicitly and explain what would be needed.\n\n"
-        "Output format rules:\n"
-        '- If no user question is provided: return JSON with keys: "summary", "recommendations".\n'
-        '- If a user question is provided: return JSON with keys: "answer", "notes".\n'
-        '- "summary" must be <= 120 words.\n'
-        '- "recommendations" must be an array of exactly 3 short items.\n'
-        "- Never include raw rows, time series dumps, or unnecessary numerical detail.\n"
-        "- When referencing WELL v2, focus on L04 and optionally mention L05 only as a stricter extension.\n"
-        "- If daily L04 results are available, explicitly report the day closest to compliance and missing minutes."
-    )
+    # 1) SYSTEM RULES: fixed behavior constraints (_SYSTEM_RULES)
 
     # ------------------------------------------------------------------
     # 2) SYSTEM CONTEXT (authoritative knowledge for THIS project)
     # ------------------------------------------------------------------
-    # Compact the daily L04 to avoid sending massive payloads
-    context_for_llm = dict(context)
-
-    l04_by_day = context_for_llm.get("l04_by_day")
-    if isinstance(l04_by_day, dict):
-        # Replace with compact version
-        context_for_llm["l04_by_day_compact"] = _compact_daily_l04(l04_by_day, top_k=7)
-        # Optionally remove the full daily block to save tokens
-        context_for_llm.pop("l04_by_day", None)
+    # Send only what the prompt needs: prompt time/cost grow ~linearly with tokens.
+    # features_by_day and the full l04_by_day are never sent (tens of KB on long ranges).
+    context_for_llm = _llm_context(context)
 
     context_block = (
-        "PROJECT CONTEXT (AUTHORITATIVE — DO NOT IGNORE):\n\n"
-        "Project name: LightWell.\n"
-        "LightWell is a wearable-based circadian lighting assessment system.\n"
-        "It does NOT directly control luminaires.\n"
-        "Lighting control logic is implemented separately at the firmware level (e.g., ESP32).\n\n"
-        "This backend:\n"
-        "- estimates melanopic EDI from calibrated sensors,\n"
-        "- evaluates compliance with WELL v2 (L04),\n"
-        "- summarizes results and explains them to the user.\n\n"
-        "The LLM is used ONLY for interpretation and explanation.\n"
-        "All compliance decisions are computed deterministically in software, not by the LLM.\n\n"
-        "------------------------------------------------------------\n"
-        "WELL v2 – L04 (Circadian Lighting Design) — DEFINITION:\n\n"
-        "WELL L04 is a building and human health standard related to circadian lighting.\n"
-        "It is NOT related to oil, gas, drilling, or industrial well control.\n\n"
-        "Purpose:\n"
-        "Support circadian entrainment by ensuring sufficient morning exposure to melanopic light.\n\n"
-        "Metric:\n"
-        "- melanopic EDI (CIE S 026).\n\n"
-        "Core requirement:\n"
-        "- A continuous 4-hour window before local noon.\n"
-        "- The melanopic EDI threshold must be maintained continuously.\n"
-        "- Averages or accumulated dose are NOT sufficient.\n\n"
-        "Thresholds:\n"
-        "- Tier 1: >= 136 melanopic EDI.\n"
-        "- Tier 2: >= 250 melanopic EDI.\n\n"
-        "Interpretation:\n"
-        "- If no valid continuous 4-hour window exists, the day is non-compliant.\n"
-        "- If daily results exist, report missing minutes and the closest day to compliance.\n"
-        "- WELL L04 does NOT define night-time limits.\n"
-        "- Night-time reduction is a design choice, not a direct L04 requirement.\n\n"
-        "------------------------------------------------------------\n"
-        "DATA CONTEXT:\n\n"
-        "User timezone: America/Bogota (UTC-5).\n"
-        'Data source: Supabase table "mediciones" with fields:\n'
-        "- created_at (TIMESTAMPTZ, stored in UTC)\n"
-        "- edi (melanopic EDI estimate)\n\n"
-        "Computed outputs (authoritative, already validated):\n"
-        f"{json.dumps(context_for_llm, ensure_ascii=False)}\n"
+        _CONTEXT_PREFIX
+        + orjson.dumps(context_for_llm, option=_ORJSON_OPTS).decode()
+        + "\n"
     )
 
     # ------------------------------------------------------------------
     # 3) USER TASK (summary or Q&A)
     # ------------------------------------------------------------------
     if question and question.strip():
-        user_task = (
-            "User question:\n"
-            f"{question.strip()}\n\n"
-            "Answer using ONLY the project and WELL L04 context above and the computed outputs. "
-            "If the question cannot be answered from the data, state clearly what is missing.\n"
-            'Return JSON with keys: "answer", "notes".\n'
-            "If daily L04 is available, include: closest day to Tier 1 compliance and missing minutes."
-        )
+        user_task = "User question:\n" + question.strip() + "\n\n" + _USER_TASK_QA_SUFFIX
     else:
-        user_task = (
-            "Generate:\n"
-            "1) A short summary (<= 120 words) describing the circadian lighting situation "
-            "and WELL L04 compliance status.\n"
-            "2) Exactly 3 actionable recommendations to improve or maintain WELL L04 compliance.\n"
-            'Return JSON with keys: "summary", "recommendations".\n'
-            "If daily L04 is available, mention the closest day to compliance and missing minutes."
-        )
+        user_task = _USER_TASK_SUMMARY
 
     return [
-        {"role": "system", "content": system_rules},
+        {"role": "system", "content": _SYSTEM_RULES},
         {"role": "system", "content": context_block},
         {"role": "user", "content": user_task},
     ]
 
 
-def _post_chat_completions(messages: List[Dict[str, str]], timeout_s: float = 15.0) -> Dict[str, Any]:
+async def _post_chat_completions(messages: List[Dict[str, str]], timeout_s: float = 15.0) -> Dict[str, Any]:
     """
     Call Groq OpenAI-compatible /chat/completions.
 
     Retries:
-      - 429: up to 3 retries with exponential backoff
+      - 429: up to 3 retries with jittered exponential backoff (honors Retry-After)
+    Concurrency:
+      - at most GROQ_CONCURRENCY (default 5) calls in flight per process
     Errors:
       - 401/403: immediate failure
       - 5xx: immediate failure
@@ -226,9 +356,12 @@ def _post_chat_completions(messages: List[Dict[str, str]], timeout_s: float = 15
     max_retries_429 = 3
     backoff_s = 1.0
 
-    with httpx.Client(timeout=timeout_s) as client:
+    client = _get_client()
+
+    # Cap in-flight Groq calls; waiting on the semaphore during backoff avoids a thundering herd
+    async with _get_semaphore():
         for attempt in range(max_retries_429 + 1):
-            resp = client.post(url, headers=headers, json=payload)
+            resp = await client.post(url, headers=headers, json=payload, timeout=timeout_s)
 
             if resp.status_code in (401, 403):
                 raise GroqError("Unauthorized (401/403). Check GROQ_API_KEY and project access.")
@@ -236,8 +369,11 @@ def _post_chat_completions(messages: List[Dict[str, str]], timeout_s: float = 15
             if resp.status_code == 429:
                 if attempt >= max_retries_429:
                     raise GroqError("Rate limited (429). Max retries reached.")
-                time.sleep(backoff_s)
-                backoff_s *= 2.0
+                delay = _retry_delay(resp, backoff_s)
+                if delay is None:
+                    raise GroqError("Rate limited (429). Retry-After too long, try again later.")
+                await asyncio.sleep(delay)
+                backoff_s = min(_MAX_RETRY_DELAY_S, backoff_s * 2.0)
                 continue
 
             if 500 <= resp.status_code <= 599:
@@ -246,7 +382,7 @@ def _post_chat_completions(messages: List[Dict[str, str]], timeout_s: float = 15
             if resp.status_code >= 400:
                 raise GroqError(f"Groq request failed ({resp.status_code}): {resp.text}")
 
-            return resp.json()
+            return orjson.loads(resp.content)
 
     raise GroqError("Groq request failed unexpectedly.")
 
@@ -266,18 +402,16 @@ def _extract_json_from_response(resp_json: Dict[str, Any]) -> Dict[str, Any]:
 
     s = (content or "").strip()
 
-    # Remove Markdown code fences if present
+    # Remove Markdown code fences if present (first line ``` / ```json, last line ```)
     if s.startswith("```"):
-        lines = s.splitlines()
-        # drop first line: ``` or ```json
-        if lines:
-            lines = lines[1:]
-        # drop last line if it's ```
-        if lines and lines[-1].strip().startswith("```"):
-            lines = lines[:-1]
-        s = "\n".join(lines).strip()
-
-    # Now try strict JSON parse
+        s = _FENCE_RE.sub("", s).strip()
+
+    # Now try strict JSON parse (orjson first; json accepts a few non-standard literals)
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        pass
+
     try:
         return json.loads(s)
     except Exception:
@@ -287,13 +421,25 @@ def _extract_json_from_response(resp_json: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
-def groq_generate(context: Dict[str, Any], question: Optional[str] = None) -> Dict[str, Any]:
+async def groq_generate(context: Dict[str, Any], question: Optional[str] = None) -> Dict[str, Any]:
     """
     High-level helper:
       - Builds messages
-      - Calls Groq
+      - Calls Groq (identical prompts are served from a 5-minute cache)
       - Returns parsed JSON (or a safe fallback)
     """
     messages = _build_messages(context=context, question=question)
-    resp_json = _post_chat_completions(messages=messages)
-    return _extract_json_from_response(resp_json)
+
+    key = hashlib.blake2b(orjson.dumps(messages), digest_size=16).hexdigest()
+    cached = _RESPONSE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    resp_json = await _post_chat_completions(messages=messages)
+    result = _extract_json_from_response(resp_json)
+
+    # Don't pin parse failures for the whole TTL (the reply may be any JSON value, not just an object)
+    if not (isinstance(result, dict) and "error" in result):
+        _RESPONSE_CACHE[key] = result
+
+    return result
@@ -1,10 +1,36 @@
-from typing import Dict, List, Any
-from datetime import datetime
-from zoneinfo import ZoneInfo
-import statistics
-
-
-def compute_features(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+from typing import Dict, List, Any, Literal, Optional, Tuple
+
+import numpy as np
+
+from app.services.timeseries import (
+    NS_PER_SECOND,
+    local_offsets_ns,
+    map_days,
+    preprocess_rows,
+    rows_to_arrays,
+    split_by_local_day,
+)
+
+# Time order the caller guarantees for ts_ns (None: unknown)
+Presorted = Optional[Literal["asc", "desc"]]
+
+# Result for an empty window; handed out as a copy (results end up in cached contexts)
+_EMPTY_FEATURES: Dict[str, Any] = {
+    "count": 0,
+    "duration_s": 0.0,
+    "edi_min": None,
+    "edi_max": None,
+    "edi_mean": None,
+    "edi_median": None,
+    "edi_std": None,
+    "edi_p10": None,
+    "edi_p90": None,
+    "edi_last": None,
+    "edi_delta_vs_median": None,
+}
+
+
+def compute_features(rows: List[Dict[str, Any]], presorted: Presorted = None) -> Dict[str, Any]:
     """
     Compute compact numerical features from EDI time series.
 
@@ -12,51 +38,70 @@ def compute_features(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
       - 'created_at': ISO 8601 string (TIMESTAMPTZ)
       - 'edi': float
 
+    presorted="asc"/"desc" declares rows already ordered by created_at
+    (e.g. fetch_rows is desc) and skips the time-order check.
+
     Returns a consistent dict even if rows is empty.
     """
+    if presorted is None:
+        ts_ns, edi = preprocess_rows(rows)
+        presorted = "asc"
+    else:
+        ts_ns, edi = rows_to_arrays(rows)
+
+    return compute_features_arr(ts_ns, edi, presorted=presorted)
+
+
+def compute_features_arr(
+    ts_ns: np.ndarray,
+    edi: np.ndarray,
+    presorted: Presorted = None,
+) -> Dict[str, Any]:
+    """
+    Same as compute_features, on column arrays.
+
+    Args:
+        ts_ns: UTC epoch nanoseconds (int64), any order unless presorted is given
+        edi: EDI values aligned with ts_ns
+        presorted: "asc"/"desc" if ts_ns is time-ordered; first/last sample are then
+                   read directly instead of scanning for min/max/argmax
+    """
 
     # Caso vacío (muy importante para robustez)
-    if not rows:
-        return {
-            "count": 0,
-            "duration_s": 0.0,
-            "edi_min": None,
-            "edi_max": None,
-            "edi_mean": None,
-            "edi_median": None,
-            "edi_std": None,
-            "edi_p10": None,
-            "edi_p90": None,
-            "edi_last": None,
-            "edi_delta_vs_median": None,
-        }
-
-    # Extraer valores
-    edis = [float(r["edi"]) for r in rows]
-    timestamps = [_parse_iso8601(r["created_at"]) for r in rows]
-
-    edis_sorted = sorted(edis)
-    timestamps_sorted = sorted(timestamps)
-
-    count = len(edis)
-
-    # Estadísticos básicos
-    edi_min = edis_sorted[0]
-    edi_max = edis_sorted[-1]
-    edi_mean = statistics.mean(edis_sorted)
-    edi_median = statistics.median(edis_sorted)
-    edi_std = statistics.stdev(edis_sorted) if count > 1 else 0.0
-
-    # Percentiles (robustos)
-    edi_p10 = _percentile(edis_sorted, 10)
-    edi_p90 = _percentile(edis_sorted, 90)
-
-    # Último valor (estado actual)
-    edi_last = edis[-1]
+    if edi.size == 0:
+        return dict(_EMPTY_FEATURES)
+
+    count = int(edi.size)
+
+    # Estadísticos básicos (NumPy C loops; .item() -> plain floats for JSON)
+    edi_min = edi.min().item()
+    edi_max = edi.max().item()
+    edi_mean = edi.mean().item()
+
+    # Percentiles (robustos) + mediana: one O(n) partition for the three order statistics
+    edi_p10, edi_median, edi_p90 = _percentiles(edi, (10, 50, 90))
+
+    # Sample std from the mean above (edi.std would recompute it): one centered pass + dot
+    if count > 1:
+        centered = edi - edi_mean
+        edi_std = (float(centered @ centered) / (count - 1)) ** 0.5
+    else:
+        edi_std = 0.0
+
+    # Primera/última muestra en el tiempo
+    if presorted == "asc":
+        first, last = 0, count - 1
+    elif presorted == "desc":
+        first, last = count - 1, 0
+    else:
+        first, last = int(np.argmin(ts_ns)), int(np.argmax(ts_ns))
+
+    # Último valor (estado actual): the most recent sample
+    edi_last = edi[last].item()
     edi_delta_vs_median = edi_last - edi_median
 
     # Duración total de la ventana
-    duration_s = (timestamps_sorted[-1] - timestamps_sorted[0]).total_seconds()
+    duration_s = (int(ts_ns[last]) - int(ts_ns[first])) / NS_PER_SECOND
 
     return {
         "count": count,
@@ -76,6 +121,7 @@ def compute_features(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
 def compute_features_daily(
     rows: List[Dict[str, Any]],
     tz: str = "America/Bogota",
+    presorted: Presorted = None,
 ) -> Dict[str, Dict[str, Any]]:
     """
     Compute the same compact features, but grouped per local day.
@@ -89,49 +135,40 @@ def compute_features_daily(
     Notes:
     - This function does NOT enforce WELL/L04 rules.
     - It only groups by local day and runs the same feature computation.
+    - presorted behaves as in compute_features (day buckets keep the row order).
     """
     if not rows:
         return {}
 
-    tzinfo = ZoneInfo(tz)
-
-    buckets: Dict[str, List[Dict[str, Any]]] = {}
-    for r in rows:
-        t = _parse_iso8601(r["created_at"])
-        if t.tzinfo is None:
-            # Defensive: if upstream gives naive timestamps, assume UTC.
-            t = t.replace(tzinfo=ZoneInfo("UTC"))
-        t_local = t.astimezone(tzinfo)
-        day = t_local.date().isoformat()
-        buckets.setdefault(day, []).append(r)
+    if presorted is None:
+        ts_ns, edi = preprocess_rows(rows)
+        presorted = "asc"
+    else:
+        ts_ns, edi = rows_to_arrays(rows)
+    local_ns = ts_ns + local_offsets_ns(ts_ns, tz)
 
     # Important: keep original semantics of compute_features (duration based on min/max time)
-    # by feeding each day-bucket back into compute_features.
-    return {day: compute_features(day_rows) for day, day_rows in buckets.items()}
+    # by feeding each day-bucket back into compute_features_arr.
+    return map_days(
+        lambda idx: compute_features_arr(ts_ns[idx], edi[idx], presorted=presorted),
+        split_by_local_day(local_ns),
+    )
 
 
-def _parse_iso8601(s: str) -> datetime:
-    """
-    Parse ISO 8601 datetime string into datetime.
-    Accepts 'Z' and '+00:00'.
+def _percentiles(values: np.ndarray, ps: Tuple[float, ...]) -> List[float]:
     """
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
-    return datetime.fromisoformat(s)
-
-
-def _percentile(sorted_values: List[float], p: float) -> float:
+    Compute percentiles ps (0–100) with linear interpolation between closest ranks
+    (same as np.percentile), partitioning once instead of sorting.
     """
-    Compute percentile p (0–100) from a sorted list.
-    """
-    if not sorted_values:
-        return None
-
-    k = (len(sorted_values) - 1) * (p / 100.0)
-    f = int(k)
-    c = min(f + 1, len(sorted_values) - 1)
-
-    if f == c:
-        return sorted_values[int(k)]
-
-    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+    last = values.size - 1
+    ks = [last * (p / 100.0) for p in ps]
+    kth = sorted({int(k) for k in ks} | {min(int(k) + 1, last) for k in ks})
+    part = np.partition(values, kth)
+
+    out = []
+    for k in ks:
+        f = int(k)
+        c = min(f + 1, last)
+        lo = part[f].item()
+        out.append(lo if f == c else lo + (part[c].item() - lo) * (k - f))
+    return out
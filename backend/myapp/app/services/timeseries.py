@@ -0,0 +1,232 @@
+from functools import lru_cache
+import sys
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
+from datetime import datetime, timedelta, timezone, tzinfo as TzInfo
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+# tz offsets only change on quarter-hour boundaries (UTC), so one lookup per bucket is exact.
+_OFFSET_BUCKET_NS = 15 * NS_PER_MINUTE
+# Spacing of the offset probes; tz rules never change twice within a week
+_OFFSET_PROBE_BUCKETS = 7 * NS_PER_DAY // _OFFSET_BUCKET_NS
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _fromisoformat_z(s: str) -> datetime:
+    # datetime.fromisoformat only accepts a trailing 'Z' from Python 3.11 on
+    return datetime.fromisoformat(s[:-1] + "+00:00" if s[-1:] == "Z" else s)
+
+
+# Parse one ISO 8601 string (accepts 'Z') into a datetime; shared by the API and the parsers below
+parse_iso8601: Callable[[str], datetime] = (
+    datetime.fromisoformat if sys.version_info >= (3, 11) else _fromisoformat_z
+)
+
+
+def parse_timestamps_ns(values: Sequence[str]) -> np.ndarray:
+    """
+    Parse ISO 8601 strings into UTC epoch nanoseconds (int64) in one vectorized pass.
+
+    Supabase returns UTC timestamps ('Z' or '+00:00'); the suffixes are stripped with
+    str.replace over one joined buffer (no per-value Python branching) and the result
+    is parsed by numpy's C parser. Any other explicit offset falls back to
+    datetime.fromisoformat. Naive timestamps are assumed to be UTC.
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    joined = ("\n".join(values) + "\n").replace("+00:00\n", "\n").replace("Z\n", "\n")
+
+    # Each date part has exactly two '-'; any extra '+'/'-' is a non-UTC offset
+    if "+" in joined or joined.count("-") != 2 * len(values):
+        return _parse_timestamps_ns_slow(values)
+
+    return np.array(joined[:-1].split("\n"), dtype="datetime64[ns]").astype(np.int64)
+
+
+def rows_to_arrays(rows: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert Supabase rows (list of dicts) into column arrays, once per request.
+
+    Returns:
+        (ts_ns: UTC epoch nanoseconds int64, edi: float64), in row order
+    """
+    ts_ns = parse_timestamps_ns([r["created_at"] for r in rows])
+    edi = np.fromiter((r["edi"] for r in rows), dtype=np.float64, count=len(rows))
+    return ts_ns, edi
+
+
+def preprocess_rows(rows: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    rows_to_arrays + sort_by_time: the shared, time-ascending SoA for one request.
+    """
+    return sort_by_time(*rows_to_arrays(rows))
+
+
+def sort_by_time(ts_ns: np.ndarray, edi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (ts_ns, edi) ordered by ascending time.
+
+    fetch_rows orders by created_at desc, so the common case is one O(n) check
+    plus a reversed copy; only unordered input pays for a (stable) argsort.
+    Results are C-contiguous, so per-day slices of them reach the numba
+    kernel with the layout it was warmed up with.
+    """
+    if ts_ns.size < 2:
+        return ts_ns, edi
+
+    step = np.diff(ts_ns)
+    if (step >= 0).all():
+        return ts_ns, edi
+    if (step <= 0).all():
+        return ts_ns[::-1].copy(), edi[::-1].copy()
+
+    order = np.argsort(ts_ns, kind="stable")
+    return ts_ns[order], edi[order]
+
+
+@lru_cache(maxsize=32)
+def get_tz(name: str) -> ZoneInfo:
+    """
+    ZoneInfo for an IANA name, memoized per process (skips ZoneInfo's own lock + cache lookup).
+    """
+    return ZoneInfo(name)
+
+
+def local_offsets_ns(ts_ns: np.ndarray, tz: str) -> np.ndarray:
+    """
+    UTC offset (ns) of tz for each UTC timestamp.
+
+    Offsets are resolved on a weekly grid over the sample range and bisected down to
+    the quarter hour only where neighbouring probes differ, so a fixed-offset zone
+    costs two lookups for up to a week of data.
+    """
+    if ts_ns.size == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    tzinfo = get_tz(tz)
+
+    def offset_at(bucket: int) -> int:
+        return _utcoffset_ns(bucket * _OFFSET_BUCKET_NS, tzinfo)
+
+    lo = int(ts_ns.min()) // _OFFSET_BUCKET_NS
+    hi = int(ts_ns.max()) // _OFFSET_BUCKET_NS
+    probes = list(range(lo, hi, _OFFSET_PROBE_BUCKETS)) + [hi]
+    probe_offsets = [offset_at(b) for b in probes]
+
+    # Buckets where the offset changes, and the offset in force from each one on
+    transitions: List[int] = []
+    offsets = [probe_offsets[0]]
+
+    def bisect(a: int, off_a: int, b: int, off_b: int) -> None:
+        if off_a == off_b:
+            return
+        if b - a == 1:
+            transitions.append(b)
+            offsets.append(off_b)
+            return
+        mid = (a + b) // 2
+        off_mid = offset_at(mid)
+        bisect(a, off_a, mid, off_mid)
+        bisect(mid, off_mid, b, off_b)
+
+    for i in range(len(probes) - 1):
+        bisect(probes[i], probe_offsets[i], probes[i + 1], probe_offsets[i + 1])
+
+    if not transitions:
+        return np.full(ts_ns.shape, offsets[0], dtype=np.int64)
+
+    edges = np.array(transitions, dtype=np.int64) * _OFFSET_BUCKET_NS
+    return np.array(offsets, dtype=np.int64)[np.searchsorted(edges, ts_ns, side="right")]
+
+
+def split_by_local_day(local_ns: np.ndarray) -> Dict[str, Union[slice, np.ndarray]]:
+    """
+    Group sample indices by local calendar day.
+
+    Args:
+        local_ns: local wall-clock epoch nanoseconds (UTC ns + offset)
+
+    Returns:
+        { "YYYY-MM-DD": indices (original order preserved within the day), ... }
+        Days are returned in ascending order. For already ordered input the
+        indices are contiguous slices, so arr[idx] is a view, not a copy.
+    """
+    if local_ns.size == 0:
+        return {}
+
+    day_ids = local_ns // NS_PER_DAY
+
+    # Time-sorted input (preprocess_rows) is already grouped: one view per day, no sort/gather
+    if (day_ids[1:] >= day_ids[:-1]).all():
+        starts = _group_starts(day_ids)
+        bounds = np.append(starts, day_ids.size).tolist()
+        labels = _day_labels(day_ids[starts])
+        return {
+            label: slice(lo, hi)
+            for label, lo, hi in zip(labels, bounds[:-1], bounds[1:])
+        }
+
+    order = np.argsort(day_ids, kind="stable")
+    sorted_ids = day_ids[order]
+    starts = _group_starts(sorted_ids)
+
+    return {
+        label: idx
+        for label, idx in zip(_day_labels(sorted_ids[starts]), np.split(order, starts[1:]))
+    }
+
+
+def map_days(fn: Callable[[Any], Any], days: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply fn to each day's value (e.g. indices from split_by_local_day), preserving day order.
+
+    Runs inline: per-day work is dominated by small NumPy calls and dict building
+    that hold the GIL, so a thread pool only added dispatch overhead.
+    """
+    return {day: fn(idx) for day, idx in days.items()}
+
+
+def to_datetime(ts_ns: int, tzinfo: TzInfo) -> datetime:
+    """
+    Convert UTC epoch nanoseconds into an aware datetime in tzinfo (microsecond precision).
+    """
+    return (_EPOCH + timedelta(microseconds=int(ts_ns) // 1000)).astimezone(tzinfo)
+
+
+def _group_starts(sorted_ids: np.ndarray) -> np.ndarray:
+    # Group boundaries where the day id changes (np.unique would sort again)
+    return np.flatnonzero(np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1])))
+
+
+def _day_labels(day_ids: np.ndarray) -> List[str]:
+    return np.datetime_as_string(day_ids.astype("datetime64[D]")).tolist()
+
+
+def _utcoffset_ns(ts_ns: int, tzinfo: ZoneInfo) -> int:
+    offset = to_datetime(ts_ns, tzinfo).utcoffset()
+    return int(offset.total_seconds()) * NS_PER_SECOND
+
+
+def _parse_timestamp_ns(s: str) -> int:
+    t = parse_iso8601(s)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    delta = t - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * NS_PER_SECOND + delta.microseconds * 1000
+
+
+def _parse_timestamps_ns_slow(values: Sequence[str]) -> np.ndarray:
+    return np.fromiter(
+        (_parse_timestamp_ns(s) for s in values),
+        dtype=np.int64,
+        count=len(values),
+    )
@@ -1,7 +1,26 @@
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta, time
+from typing import List, Dict, Any
+from datetime import timedelta, timezone, tzinfo as TzInfo
 from zoneinfo import ZoneInfo
 
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to the pure-Python scan
+    njit = None
+
+from app.services.timeseries import (
+    NS_PER_DAY,
+    NS_PER_HOUR,
+    NS_PER_MINUTE,
+    get_tz,
+    local_offsets_ns,
+    map_days,
+    preprocess_rows,
+    split_by_local_day,
+    to_datetime,
+)
+
 
 # WELL v2 – L04 thresholds (melanopic EDI)
 TIER_1_THRESHOLD = 136.0  # ≈ 150 EML
@@ -13,30 +32,55 @@ REQUIRED_MINUTES = int(REQUIRED_DURATION.total_seconds() // 60)
 # Continuity rule: if the gap between consecutive samples exceeds this, the streak breaks.
 MAX_GAP_MIN = 10
 
+# Local noon, as an offset from local midnight
+_NOON_NS = 12 * NS_PER_HOUR
+
+# Empty tier results, built once per tier; _empty_tier_result hands out copies
+_EMPTY_TIERS: Dict[float, Dict[str, Any]] = {
+    threshold: {
+        "compliant": False,
+        "threshold": threshold,
+        "best_continuous_minutes": 0,
+        "missing_minutes": REQUIRED_MINUTES,
+        "best_window_start": None,
+        "best_window_end": None,
+        "required_minutes": REQUIRED_MINUTES,
+        "max_gap_min": MAX_GAP_MIN,
+    }
+    for threshold in (TIER_1_THRESHOLD, TIER_2_THRESHOLD)
+}
+
 
 def evaluate_l04(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Legacy (single-bucket) evaluator.
 
     NOTE:
-    - This function evaluates only one time series (as given), filtering to < 12:00
-      based on the timestamp's own timezone.
+    - This function evaluates only one time series (as given), filtering to < 12:00 UTC.
     - For the correct WELL L04 interpretation "per day (local)", use evaluate_l04_daily().
     """
     if not rows:
         return _empty_result()
 
-    series = [(_parse_iso8601(r["created_at"]), float(r["edi"])) for r in rows]
-    series.sort(key=lambda x: x[0])
+    ts_ns, edi = preprocess_rows(rows)
+
+    return evaluate_l04_arr(ts_ns, edi)
+
 
-    # Keep only samples before 12:00 in the timestamp's timezone
-    series = [(t, edi) for (t, edi) in series if t.time() < time(12, 0)]
+def evaluate_l04_arr(ts_ns: np.ndarray, edi: np.ndarray) -> Dict[str, Any]:
+    """
+    Same as evaluate_l04, on column arrays (UTC epoch ns + EDI, any order).
+    """
+    # Keep only samples before 12:00 UTC (Supabase timestamps are UTC)
+    morning = _morning_indices(ts_ns, ts_ns)
 
-    if len(series) < 2:
+    if morning.size < 2:
         return _empty_result()
 
-    tier1 = _evaluate_threshold(series, TIER_1_THRESHOLD, max_gap_min=MAX_GAP_MIN)
-    tier2 = _evaluate_threshold(series, TIER_2_THRESHOLD, max_gap_min=MAX_GAP_MIN)
+    ts_ns, edi = ts_ns[morning], edi[morning]
+
+    tier1 = _evaluate_threshold(ts_ns, edi, TIER_1_THRESHOLD, max_gap_min=MAX_GAP_MIN, tzinfo=timezone.utc)
+    tier2 = _evaluate_threshold(ts_ns, edi, TIER_2_THRESHOLD, max_gap_min=MAX_GAP_MIN, tzinfo=timezone.utc)
 
     return {"tier_1": tier1, "tier_2": tier2}
 
@@ -62,51 +106,149 @@ def evaluate_l04_daily(
     if not rows:
         return {}
 
-    tzinfo = ZoneInfo(tz)
-
-    # Build local-time series
-    series_local: List[Tuple[datetime, float]] = []
-    for r in rows:
-        t = _parse_iso8601(r["created_at"])
-        if t.tzinfo is None:
-            # Defensive: if upstream gives naive timestamps, assume UTC.
-            t = t.replace(tzinfo=ZoneInfo("UTC"))
-        t_local = t.astimezone(tzinfo)
-        series_local.append((t_local, float(r["edi"])))
-
-    series_local.sort(key=lambda x: x[0])
-
-    # Group by local day
-    by_day: Dict[str, List[Tuple[datetime, float]]] = {}
-    for t_local, edi in series_local:
-        day = t_local.date().isoformat()
-        by_day.setdefault(day, []).append((t_local, edi))
-
-    out: Dict[str, Any] = {}
-    for day, day_series in by_day.items():
-        # Morning window: before local noon
-        morning = [(t, edi) for (t, edi) in day_series if t.time() < time(12, 0)]
-
-        if len(morning) < 2:
-            out[day] = {
-                "tier_1": _empty_tier_result(TIER_1_THRESHOLD),
-                "tier_2": _empty_tier_result(TIER_2_THRESHOLD),
-                "notes": "insufficient_data_before_noon",
-            }
+    tzinfo = get_tz(tz)
+
+    # Parse + bucket by local day in one vectorized pass
+    ts_ns, edi = preprocess_rows(rows)
+    local_ns = ts_ns + local_offsets_ns(ts_ns, tz)
+
+    return map_days(
+        lambda idx: evaluate_l04_day(ts_ns[idx], local_ns[idx], edi[idx], tzinfo, max_gap_min=max_gap_min),
+        split_by_local_day(local_ns),
+    )
+
+
+def evaluate_l04_day(
+    ts_ns: np.ndarray,
+    local_ns: np.ndarray,
+    edi: np.ndarray,
+    tzinfo: ZoneInfo,
+    max_gap_min: int = MAX_GAP_MIN,
+) -> Dict[str, Any]:
+    """
+    Evaluate L04 for the samples of a single local day.
+
+    Args:
+        ts_ns: UTC epoch nanoseconds, ascending
+        local_ns: same instants as local wall-clock nanoseconds (tz offset applied)
+        edi: melanopic EDI values
+        tzinfo: timezone used to render best_window_start/end
+    """
+    # Morning window: before local noon, a prefix of the sorted day.
+    # DST shifts happen at night, so sorted local times stay partitioned around noon.
+    noon = local_ns[0] - local_ns[0] % NS_PER_DAY + _NOON_NS if local_ns.size else 0
+    cut = int(np.searchsorted(local_ns, noon, side="left"))
+    ts_ns, edi = ts_ns[:cut], edi[:cut]
+
+    if ts_ns.size < 2:
+        return {
+            "tier_1": _empty_tier_result(TIER_1_THRESHOLD),
+            "tier_2": _empty_tier_result(TIER_2_THRESHOLD),
+            "notes": "insufficient_data_before_noon",
+        }
+
+    t1 = _evaluate_threshold(ts_ns, edi, TIER_1_THRESHOLD, max_gap_min=max_gap_min, tzinfo=tzinfo)
+    t2 = _evaluate_threshold(ts_ns, edi, TIER_2_THRESHOLD, max_gap_min=max_gap_min, tzinfo=tzinfo)
+
+    return {"tier_1": t1, "tier_2": t2, "notes": None}
+
+
+def _morning_indices(ts_ns: np.ndarray, wall_ns: np.ndarray) -> np.ndarray:
+    """
+    Indices of the samples before noon on the wall_ns clock (UTC or local), in time order.
+    """
+    order = np.argsort(ts_ns, kind="stable")
+    return order[(wall_ns[order] % NS_PER_DAY) < _NOON_NS]
+
+
+def _best_streak(ts_ns, edi, threshold, max_gap_ns):
+    """
+    Single forward scan over a time-sorted series (the numeric kernel of L04).
+
+    Finds the longest run where edi >= threshold and consecutive samples are
+    at most max_gap_ns apart.
+
+    Returns:
+      (best_dur_ns, best_start_idx, best_end_idx); indices are -1 if no run
+      lasts longer than zero.
+    """
+    best_dur = 0
+    best_start = -1
+    best_end = -1
+
+    cur_start = -1
+    cur_end = -1
+
+    for i in range(len(ts_ns)):
+        if edi[i] < threshold:
+            cur_start = -1
+            cur_end = -1
             continue
 
-        t1 = _evaluate_threshold(morning, TIER_1_THRESHOLD, max_gap_min=max_gap_min)
-        t2 = _evaluate_threshold(morning, TIER_2_THRESHOLD, max_gap_min=max_gap_min)
+        if cur_start == -1 or ts_ns[i] - ts_ns[cur_end] > max_gap_ns:
+            # New streak, or continuity broken due to missing samples / large gap
+            cur_start = i
+        cur_end = i
 
-        out[day] = {"tier_1": t1, "tier_2": t2, "notes": None}
+        dur = ts_ns[cur_end] - ts_ns[cur_start]
+        if dur > best_dur:
+            best_dur = dur
+            best_start = cur_start
+            best_end = cur_end
 
-    return out
+    return best_dur, best_start, best_end
+
+
+def _best_streak_np(ts_ns, edi, threshold, max_gap_ns):
+    """
+    Same result as _best_streak, vectorized with run boundaries instead of a scan.
+
+    A run starts at an above-threshold sample whose predecessor is below threshold
+    or more than max_gap_ns earlier, and ends symmetrically; starts and ends pair up in order.
+    """
+    ok = edi >= threshold
+    if not ok.any():
+        return 0, -1, -1
+
+    brk = np.diff(ts_ns) > max_gap_ns
+    starts = np.flatnonzero(ok & np.concatenate(([True], ~ok[:-1] | brk)))
+    ends = np.flatnonzero(ok & np.concatenate((~ok[1:] | brk, [True])))
+
+    durs = ts_ns[ends] - ts_ns[starts]
+    k = int(np.argmax(durs))  # first longest run, like the scan's strict '>'
+    if durs[k] <= 0:
+        return 0, -1, -1
+
+    # The scan's strict '>' stops at the first sample of a run's final timestamp
+    end = int(np.searchsorted(ts_ns, ts_ns[ends[k]], side="left"))
+
+    return int(durs[k]), int(starts[k]), end
+
+
+if njit is not None:
+    # cache=True persists the compiled kernel across restarts
+    _best_streak = njit(cache=True)(_best_streak)
+else:
+    # Without numba, the Python scan would cost one bytecode loop per sample
+    _best_streak = _best_streak_np
+
+
+def warm_up() -> None:
+    """
+    Run the streak kernel once on a tiny series so JIT compilation (or loading the
+    on-disk cache) happens at startup rather than on the first request.
+    """
+    ts_ns = np.array([0, NS_PER_MINUTE], dtype=np.int64)
+    edi = np.array([TIER_1_THRESHOLD, TIER_1_THRESHOLD], dtype=np.float64)
+    _evaluate_threshold(ts_ns, edi, TIER_1_THRESHOLD, max_gap_min=MAX_GAP_MIN, tzinfo=timezone.utc)
 
 
 def _evaluate_threshold(
-    series: List[Tuple[datetime, float]],
+    ts_ns: np.ndarray,
+    edi: np.ndarray,
     threshold: float,
     max_gap_min: int,
+    tzinfo: TzInfo,
 ) -> Dict[str, Any]:
     """
     For a single (already time-sorted) series, find the best continuous streak
@@ -116,42 +258,13 @@ def _evaluate_threshold(
       - compliant: True if best streak >= 4h
       - best_continuous_minutes
       - missing_minutes (gap to 240)
-      - best_window_start/end (isoformat)
+      - best_window_start/end (isoformat, rendered in tzinfo)
     """
-    max_gap = timedelta(minutes=max_gap_min)
+    best_dur_ns, best_start, best_end = _best_streak(
+        ts_ns, edi, threshold, max_gap_min * NS_PER_MINUTE
+    )
 
-    best_start: Optional[datetime] = None
-    best_end: Optional[datetime] = None
-    best_dur = timedelta(0)
-
-    cur_start: Optional[datetime] = None
-    cur_end: Optional[datetime] = None
-
-    for t, edi in series:
-        if edi < threshold:
-            cur_start = None
-            cur_end = None
-            continue
-
-        if cur_start is None:
-            cur_start = t
-            cur_end = t
-        else:
-            gap = t - cur_end  # type: ignore[arg-type]
-            if gap <= max_gap:
-                cur_end = t
-            else:
-                # Break continuity due to missing samples / large gap
-                cur_start = t
-                cur_end = t
-
-        dur = (cur_end - cur_start)  # type: ignore[operator]
-        if dur > best_dur:
-            best_dur = dur
-            best_start = cur_start
-            best_end = cur_end
-
-    best_minutes = int(best_dur.total_seconds() // 60)
+    best_minutes = int(best_dur_ns // NS_PER_MINUTE)
     missing_minutes = max(0, REQUIRED_MINUTES - best_minutes)
 
     return {
@@ -159,30 +272,15 @@ def _evaluate_threshold(
         "threshold": threshold,
         "best_continuous_minutes": best_minutes,
         "missing_minutes": missing_minutes,
-        "best_window_start": best_start.isoformat() if best_start else None,
-        "best_window_end": best_end.isoformat() if best_end else None,
+        "best_window_start": to_datetime(ts_ns[best_start], tzinfo).isoformat() if best_start >= 0 else None,
+        "best_window_end": to_datetime(ts_ns[best_end], tzinfo).isoformat() if best_end >= 0 else None,
         "required_minutes": REQUIRED_MINUTES,
         "max_gap_min": max_gap_min,
     }
 
 
-def _parse_iso8601(s: str) -> datetime:
-    if s.endswith("Z"):
-        s = s[:-1] + "+00:00"
-    return datetime.fromisoformat(s)
-
-
 def _empty_tier_result(threshold: float) -> Dict[str, Any]:
-    return {
-        "compliant": False,
-        "threshold": threshold,
-        "best_continuous_minutes": 0,
-        "missing_minutes": REQUIRED_MINUTES,
-        "best_window_start": None,
-        "best_window_end": None,
-        "required_minutes": REQUIRED_MINUTES,
-        "max_gap_min": MAX_GAP_MIN,
-    }
+    return dict(_EMPTY_TIERS[threshold])
 
 
 def _empty_result() -> Dict[str, Any]:
@@ -0,0 +1,83 @@
+import re
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pytest
+
+
+def _ts(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class _FakeQuery:
+    """
+    The subset of the PostgREST query builder used by data_service, over an in-memory table.
+    """
+
+    _KEYSET = re.compile(r'(\w+)\.lt\."(.+)",and\(\1\.eq\."\2",id\.lt\.(\d+)\)')
+
+    def __init__(self, table: List[Dict[str, Any]]):
+        self._table = table
+        self._filters = []
+        self._limit = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(lambda r: _ts(r[column]) >= _ts(value))
+        return self
+
+    def lte(self, column, value):
+        self._filters.append(lambda r: _ts(r[column]) <= _ts(value))
+        return self
+
+    def or_(self, filters):
+        column, value, last_id = self._KEYSET.fullmatch(filters).groups()
+        self._filters.append(lambda r: (_ts(r[column]), r["id"]) < (_ts(value), int(last_id)))
+        return self
+
+    @property
+    def not_(self):
+        return self
+
+    def is_(self, column, value):
+        self._filters.append(lambda r: r[column] is not None)
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def execute(self):
+        rows = [r for r in self._table if all(f(r) for f in self._filters)]
+        rows.sort(key=lambda r: (_ts(r["created_at"]), r["id"]), reverse=True)
+
+        class _Response:
+            data = [dict(r) for r in rows[: self._limit]]
+
+        return _Response()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+
+    def insert(self, created_at: str, edi: float) -> None:
+        self.rows.append({"id": len(self.rows) + 1, "created_at": created_at, "edi": edi})
+
+    def table(self, name):
+        return _FakeQuery(self.rows)
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    from app.services import data_service
+
+    sb = FakeSupabase()
+    monkeypatch.setattr(data_service, "get_supabase", lambda: sb)
+    monkeypatch.setattr(data_service, "_live_window", None)
+    return sb
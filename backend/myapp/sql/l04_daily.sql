@@ -0,0 +1,26 @@
+-- l04_daily: EDI samples in [_start, _end] grouped by local day (America/Bogota).
+--
+-- One row per day with time-ordered arrays, so the backend receives ~1 row per day
+-- instead of one JSON object per sample, and does not re-group in Python.
+--
+-- Apply once in the Supabase SQL editor. Called from data_service.fetch_daily_series().
+
+create or replace function public.l04_daily(_start timestamptz, _end timestamptz)
+returns table (day date, ts_arr timestamptz[], edi_arr float8[])
+language sql
+stable
+as $$
+  select
+    (created_at at time zone 'America/Bogota')::date as day,
+    array_agg(created_at order by created_at) as ts_arr,
+    array_agg(edi order by created_at) as edi_arr
+  from public.mediciones
+  where created_at >= _start
+    and created_at <= _end
+    and edi is not null
+  group by 1
+  order by 1;
+$$;
+
+-- Supports the range filter above (and fetch_rows).
+create index if not exists mediciones_created_at_idx on public.mediciones (created_at);
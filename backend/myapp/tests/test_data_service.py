@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services import data_service
+from app.services.data_service import fetch_rows, fetch_rows_live
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+def test_fetch_rows_pages_without_duplicates(fake_supabase, monkeypatch):
+    monkeypatch.setattr(data_service, "PAGE_SIZE", 3)
+    t0 = datetime(2025, 12, 9, tzinfo=timezone.utc)
+    for i in range(10):
+        # pairs of identical timestamps straddle page boundaries
+        fake_supabase.insert(_iso(t0 + timedelta(minutes=i // 2)), float(i))
+
+    count, rows = fetch_rows(_iso(t0), _iso(t0 + timedelta(hours=1)))
+
+    assert count == 10
+    assert sorted(r["id"] for r in rows) == list(range(1, 11))
+
+
+def test_fetch_rows_live_sees_new_rows_when_end_is_in_the_future(fake_supabase):
+    now = datetime.now(timezone.utc)
+    start = _iso(now - timedelta(hours=1))
+    end = _iso(now + timedelta(hours=6))  # e.g. "today" ending at 23:59:59 local
+
+    for i in range(5):
+        fake_supabase.insert(_iso(now - timedelta(minutes=50 - i)), float(i))
+
+    count, _ = fetch_rows_live(start, end)
+    assert count == 5
+
+    fake_supabase.insert(_iso(now), 5.0)
+    count, rows = fetch_rows_live(start, end)
+
+    assert count == 6
+    assert sorted(r["id"] for r in rows) == list(range(1, 7))
+
+
+def test_fetch_rows_live_picks_up_late_commits(fake_supabase):
+    now = datetime.now(timezone.utc)
+    start = _iso(now - timedelta(hours=1))
+    end = _iso(now + timedelta(hours=1))
+
+    fake_supabase.insert(_iso(now - timedelta(minutes=10)), 1.0)
+    fake_supabase.insert(_iso(now - timedelta(seconds=5)), 2.0)
+    fetch_rows_live(start, end)
+
+    # committed after the poll, but timestamped before the newest row already served
+    fake_supabase.insert(_iso(now - timedelta(seconds=20)), 3.0)
+    count, rows = fetch_rows_live(start, end)
+
+    assert count == 3
+    assert [r["edi"] for r in rows] == [2.0, 3.0, 1.0]
+
+
+def test_fetch_rows_live_drops_rows_that_slid_out(fake_supabase):
+    now = datetime.now(timezone.utc)
+    for i in range(6):
+        fake_supabase.insert(_iso(now - timedelta(minutes=60 - 10 * i)), float(i))
+
+    fetch_rows_live(_iso(now - timedelta(minutes=65)), _iso(now))
+    count, rows = fetch_rows_live(_iso(now - timedelta(minutes=45)), _iso(now))
+
+    assert count == 4
+    assert [r["edi"] for r in rows] == [5.0, 4.0, 3.0, 2.0]
@@ -0,0 +1,23 @@
+import numpy as np
+
+from app.services.timeseries import _parse_timestamps_ns_slow, parse_timestamps_ns
+
+
+def test_parse_timestamps_ns_matches_slow_path():
+    cases = [
+        [],
+        ["2025-12-09T11:22:33.123456+00:00", "2025-12-09T11:22:34+00:00"],
+        ["2025-12-09T11:22:33Z", "2025-12-09T11:22:33.5Z"],
+        ["2025-12-09T11:22:33", "2025-12-09 11:22:33.000001"],
+        # non-UTC offsets go through the slow path
+        ["2025-12-09T06:22:33-05:00", "2025-12-09T11:22:33+00:00"],
+        ["2025-12-09T16:52:33.25+05:30"],
+    ]
+    for values in cases:
+        np.testing.assert_array_equal(parse_timestamps_ns(values), _parse_timestamps_ns_slow(values))
+
+
+def test_parse_timestamps_ns_applies_offsets():
+    ts_ns = parse_timestamps_ns(["2025-12-09T06:00:00-05:00", "2025-12-09T11:00:00Z"])
+
+    assert ts_ns[0] == ts_ns[1]
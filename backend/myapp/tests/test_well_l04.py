@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.services import well_l04
+from app.services.timeseries import NS_PER_MINUTE
+from app.services.well_l04 import TIER_1_THRESHOLD, _best_streak_np, evaluate_l04_daily
+
+
+BOGOTA = timezone(timedelta(hours=-5))
+
+
+def _random_series(rng: np.random.Generator, n: int):
+    # 1-minute cadence with duplicate timestamps (step 0) and gaps past MAX_GAP_MIN
+    steps = rng.choice([0, 1, 1, 1, 2, 5, 11, 30], size=n) * NS_PER_MINUTE
+    ts_ns = np.cumsum(steps).astype(np.int64)
+    edi = rng.choice([50.0, TIER_1_THRESHOLD, 200.0, 400.0], size=n)
+    return ts_ns, edi
+
+
+def test_best_streak_np_matches_scan():
+    scan = getattr(well_l04._best_streak, "py_func", None)
+    if scan is None:
+        pytest.skip("numba not installed: _best_streak is already the NumPy version")
+
+    rng = np.random.default_rng(0)
+    max_gap_ns = well_l04.MAX_GAP_MIN * NS_PER_MINUTE
+    for n in (0, 1, 2, 5, 50, 500):
+        for _ in range(50):
+            ts_ns, edi = _random_series(rng, n)
+            for threshold in (well_l04.TIER_1_THRESHOLD, well_l04.TIER_2_THRESHOLD):
+                assert tuple(map(int, _best_streak_np(ts_ns, edi, threshold, max_gap_ns))) == tuple(
+                    map(int, scan(ts_ns, edi, threshold, max_gap_ns))
+                )
+
+
+def _rows(start: datetime, minutes: int, edi: float):
+    return [
+        {"created_at": (start + timedelta(minutes=m)).astimezone(timezone.utc).isoformat(), "edi": edi}
+        for m in range(minutes + 1)
+    ]
+
+
+def test_evaluate_l04_daily_known_windows():
+    day1 = datetime(2025, 12, 9, 6, 0, tzinfo=BOGOTA)
+    day2 = datetime(2025, 12, 10, 6, 0, tzinfo=BOGOTA)
+    rows = (
+        # Day 1: exactly 4 h at tier 1; the bright afternoon must not count
+        _rows(day1, 240, 200.0)
+        + _rows(day1.replace(hour=13), 300, 500.0)
+        # Day 2: 2 h at tier 2, a 15 min gap, then 2 h more
+        + _rows(day2, 120, 300.0)
+        + _rows(day2 + timedelta(minutes=135), 120, 300.0)
+    )
+
+    result = evaluate_l04_daily(rows[::-1], tz="America/Bogota")
+
+    assert list(result) == ["2025-12-09", "2025-12-10"]
+
+    d1 = result["2025-12-09"]
+    assert d1["notes"] is None
+    assert d1["tier_1"]["compliant"] is True
+    assert d1["tier_1"]["best_continuous_minutes"] == 240
+    assert d1["tier_1"]["missing_minutes"] == 0
+    assert d1["tier_1"]["best_window_start"] == "2025-12-09T06:00:00-05:00"
+    assert d1["tier_1"]["best_window_end"] == "2025-12-09T10:00:00-05:00"
+    assert d1["tier_2"]["compliant"] is False
+    assert d1["tier_2"]["best_continuous_minutes"] == 0
+
+    d2 = result["2025-12-10"]
+    for tier in ("tier_1", "tier_2"):
+        assert d2[tier]["compliant"] is False
+        assert d2[tier]["best_continuous_minutes"] == 120
+        assert d2[tier]["missing_minutes"] == 120
+        assert d2[tier]["best_window_start"] == "2025-12-10T06:00:00-05:00"
@@ -24,7 +24,10 @@ export function getDayData(
   start: string,
   end: string
 ): Promise<ApiResult<DailyViewResponse>> {
-  return apiFetch(`/data?start=${encodeURIComponent(start)}&end=${encodeURIComponent(end)}`);
+  // The UI only renders features/L04; skip echoing every raw sample
+  return apiFetch(
+    `/data?start=${encodeURIComponent(start)}&end=${encodeURIComponent(end)}&include_rows=false`
+  );
 }
 
 export function getDayInsight(
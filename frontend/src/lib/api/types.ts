@@ -33,6 +33,7 @@ export interface Features {
 }
 
 export interface RawRow {
+  id: number;
   created_at: ISODateTime;
   edi: number;
 }
@@ -43,7 +44,7 @@ export interface DailyViewResponse {
   l04_global: { tier_1: TierResult; tier_2: TierResult };
   features_by_day: Record<ISODate, Features>;
   l04_by_day: Record<ISODate, L04Result>;
-  rows: RawRow[];
+  rows?: RawRow[];
 }
 
 export type LLMOutput =
@@ -4,6 +4,7 @@
 import serial
 import serial.tools.list_ports
 import csv
+import io
 import os
 import time
 
@@ -21,6 +22,24 @@ FORCED_PORT = None
 LABEL = "8"   # e.g., "lamp_on", "lamp_off", "outdoor", etc.
 # <<<<<< CHANGE THIS FOR YOUR SESSION >>>>>>
 
+# Rows are buffered and flushed to disk every N samples (and on Ctrl+C)
+FLUSH_EVERY = 100
+
+def csv_field(value):
+    """Render one CSV field exactly as csv.writer does inside a row (quoting ',', '"', ...)."""
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="").writerow(["", value])
+    return buf.getvalue()[1:]  # drop the leading "," of the dummy first field
+
+HEADER = b"temp,violet,blue,green,yellow,orange,red,lux,label\r\n"
+# One row per sample; %a renders floats as repr(), the same text (and \r\n) csv.writer wrote.
+# The label is quoted once here and its '%' escaped, since it becomes part of the format.
+ROW_FMT = (
+    b"%a,%a,%a,%a,%a,%a,%a,%a,"
+    + csv_field(LABEL).encode("utf-8").replace(b"%", b"%%")
+    + b"\r\n"
+)
+
 # ================================
 # HELPERS
 # ================================
@@ -41,11 +60,10 @@ def detect_port():
 def prepare_csv(path):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     new_file = not os.path.exists(path)
-    f = open(path, "a", newline="")
-    w = csv.writer(f)
+    f = open(path, "ab", buffering=64 * 1024)
     if new_file:
-        w.writerow(["temp","violet","blue","green","yellow","orange","red","lux","label"])
-    return f, w
+        f.write(HEADER)
+    return f
 
 # ================================
 # MAIN
@@ -53,44 +71,40 @@ def prepare_csv(path):
 def main():
     port = detect_port()
     print(f"[INFO] Opening {port} @ {BAUD_RATE} baud...")
-    with serial.Serial(port, BAUD_RATE, timeout=1) as ser, prepare_csv(CSV_PATH)[0] as f:
-        writer = csv.writer(f)
+    with serial.Serial(port, BAUD_RATE, timeout=1) as ser, prepare_csv(CSV_PATH) as f:
         time.sleep(2)  # brief pause to let the Arduino boot
 
         print("[INFO] Reading. Press Ctrl+C to stop.\n")
         num_ok = 0
         try:
             while True:
-                raw = ser.readline().decode("utf-8", errors="ignore").strip()
-                if not raw or raw.startswith("#"):
+                # float() accepts bytes: no decode, one C-level map per line
+                raw = ser.readline().strip()
+                if not raw or raw.startswith(b"#"):
                     continue
-                parts = raw.split(",")
+                parts = raw.split(b",")
                 if len(parts) != 8:
                     # malformed line; skip
                     continue
 
-                # simple parse — skip line on error
+                # temp, violet, blue, green, yellow, orange, red, lux — skip line on error
                 try:
-                    temp   = float(parts[0])
-                    violet = float(parts[1])
-                    blue   = float(parts[2])
-                    green  = float(parts[3])
-                    yellow = float(parts[4])
-                    orange = float(parts[5])
-                    red    = float(parts[6])
-                    lux    = float(parts[7])
+                    values = tuple(map(float, parts))
                 except ValueError:
                     continue
 
-                writer.writerow([temp, violet, blue, green, yellow, orange, red, lux, LABEL])
-                f.flush()  # flush to disk immediately
+                f.write(ROW_FMT % values)
                 num_ok += 1
 
+                if num_ok % FLUSH_EVERY == 0:
+                    f.flush()
+
                 # lightweight console feedback every 20 samples
                 if num_ok % 20 == 0:
                     print(f"[OK] {num_ok} samples saved...")
 
         except KeyboardInterrupt:
+            f.flush()
             print(f"\n[STOP] Capture stopped. Total saved: {num_ok}")
             print(f"[✔] CSV at: {os.path.abspath(CSV_PATH)}")
 